@@ -27,6 +27,11 @@ OPCIONES
                 Si NO se proporciona, se usa TODO el periodo disponible (sin filtro temporal).
 --src SRC       Fuente de datos de argopy: erddap o gdac (por defecto: erddap)
 --mode MODE     Modo de argopy: expert o standard (por defecto: expert)
+--vars LISTA    Variables a conservar, separadas por comas (p.ej. TEMP,PSAL,PRES).
+                Por defecto 'all': se conservan todas (incluidos *_QC, *_ADJUSTED).
+                La variable de tiempo TIME/JULD/time se conserva siempre.
+--engine ENG    Motor de escritura NetCDF: h5netcdf o netcdf4 (por defecto: h5netcdf).
+                Ambos escriben NETCDF4; use netcdf4 si prefiere la librería libnetcdf.
 -o, --output    Nombre de archivo de salida (.nc). Si no se da, se genera uno automáticamente.
 
 EJEMPLOS
@@ -64,13 +69,23 @@ import logging
 import os
 import warnings
 from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple, Union
 
 import numpy as np
+import pandas as pd
 import xarray as xr
 import argopy
 from argopy import DataFetcher as ArgoDataFetcher
 
+# =====================================================
+# WARNINGS
+# =====================================================
+# Filtro único a nivel de módulo (avisos ruidosos de argopy/xarray).
+# Categorías y módulos acotados para que otros avisos sigan apareciendo,
+# también en procesos que importan este script (p.ej. para usar run()).
+warnings.filterwarnings("ignore", category=UserWarning, module=r"argopy|xarray")
+warnings.filterwarnings("ignore", category=FutureWarning, module=r"argopy|xarray")
+
 # =====================================================
 # LOGGING
 # =====================================================
@@ -89,35 +104,56 @@ def leer_codigo_desde_arg(arg: str) -> int:
     """
     Interpreta el argumento principal:
     - Si es un número: lo devuelve como int.
-    - Si termina en .py y existe: importa FLOAT_ID, ARGO_CODE o ARGO_CODES[0].
+    - Si termina en .py y existe: lee (sin ejecutar el archivo) FLOAT_ID,
+      ARGO_CODE o ARGO_CODES[0], que deben ser literales.
     """
-    # Caso 1: es un entero (ej. "3902585")
-    try:
+    # Caso 1: es un entero (ej. "3902585"); se comprueba sin lanzar excepciones
+    if arg.isdecimal() or (arg.startswith("-") and arg[1:].isdecimal()):
         code = int(arg)
         logger.info(f"Código leído desde línea de comandos: {code}")
         return code
-    except ValueError:
-        pass  # no es número simple, probamos como .py
 
-    # Caso 2: archivo .py
+    # Caso 2: archivo .py (se comprueba la extensión antes de tocar el disco)
     if arg.endswith(".py") and os.path.exists(arg):
-        import importlib.util
+        import ast
 
         logger.info(f"Leyendo código desde archivo de configuración Python: {arg}")
-        spec = importlib.util.spec_from_file_location("float_cfg_mod", arg)
-        mod = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(mod)  # type: ignore
-
-        if hasattr(mod, "FLOAT_ID"):
-            code = int(getattr(mod, "FLOAT_ID"))
+        # Se analiza el archivo sin ejecutarlo: sólo se leen asignaciones de constantes
+        with open(arg, "rb") as fh:
+            tree = ast.parse(fh.read(), arg)
+
+        cfg = {}
+        for node in tree.body:
+            if (
+                isinstance(node, ast.Assign)
+                and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name)
+            ):
+                target, value = node.targets[0], node.value
+            elif (
+                isinstance(node, ast.AnnAssign)
+                and node.value is not None
+                and isinstance(node.target, ast.Name)
+            ):
+                # Asignación anotada, p.ej. FLOAT_ID: int = 3902585
+                target, value = node.target, node.value
+            else:
+                continue
+            try:
+                cfg[target.id] = ast.literal_eval(value)
+            except (ValueError, TypeError, MemoryError, RecursionError):
+                pass  # no es un literal válido (p.ej. una llamada); se ignora
+
+        if "FLOAT_ID" in cfg:
+            code = int(cfg["FLOAT_ID"])
             logger.info(f"Usando FLOAT_ID definido en {arg}: {code}")
             return code
-        if hasattr(mod, "ARGO_CODE"):
-            code = int(getattr(mod, "ARGO_CODE"))
+        if "ARGO_CODE" in cfg:
+            code = int(cfg["ARGO_CODE"])
             logger.info(f"Usando ARGO_CODE definido en {arg}: {code}")
             return code
-        if hasattr(mod, "ARGO_CODES"):
-            lista = getattr(mod, "ARGO_CODES")
+        if "ARGO_CODES" in cfg:
+            lista = cfg["ARGO_CODES"]
             if isinstance(lista, (list, tuple)) and len(lista) > 0:
                 code = int(lista[0])
                 logger.info(f"Usando primer elemento de ARGO_CODES en {arg}: {code}")
@@ -140,18 +176,73 @@ def _get_time_var(ds: xr.Dataset) -> Optional[str]:
     return None
 
 
+def _es_monotono(tv: np.ndarray) -> bool:
+    """True si el arreglo 1-D de tiempos es no decreciente y sin NaT."""
+    return tv.ndim == 1 and tv.size > 0 and bool(np.all(tv[1:] >= tv[:-1])) and not np.isnat(tv[0])
+
+
+# Kernel Numba (opcional) para el filtro temporal en series no monótonas.
+# Se compila en el primer uso: None = aún no intentado, False = numba no disponible.
+_range_indices = None
+
+
+def _kernel_numba():
+    """Importa numba y compila el kernel la primera vez; devuelve el kernel o False."""
+    global _range_indices
+    if _range_indices is None:
+        try:
+            from numba import njit
+        except ImportError:
+            _range_indices = False
+            return _range_indices
+
+        @njit(cache=True, nogil=True)
+        def _kernel(tv_i8, lo_i8, hi_i8):
+            """Índices i con lo_i8 <= tv_i8[i] <= hi_i8, en una sola pasada."""
+            out = np.empty(tv_i8.size, np.int64)
+            k = 0
+            for i in range(tv_i8.size):
+                if lo_i8 <= tv_i8[i] <= hi_i8:
+                    out[k] = i
+                    k += 1
+            return out[:k]
+
+        _range_indices = _kernel
+    return _range_indices
+
+
+def _indices_en_rango(tv: np.ndarray, t0_np: np.datetime64, t1_np: np.datetime64) -> np.ndarray:
+    """
+    Devuelve los índices de tv (datetime64, 1-D) dentro de [t0_np, t1_np].
+    Usa el kernel Numba si está disponible; si no, np.flatnonzero sobre la máscara.
+    Los NaT nunca quedan dentro del rango.
+    """
+    kernel = _kernel_numba()
+    if kernel:
+        lo_i8 = np.datetime64(t0_np).astype(tv.dtype).astype(np.int64)
+        hi_i8 = np.datetime64(t1_np).astype(tv.dtype).astype(np.int64)
+        return kernel(np.ascontiguousarray(tv).view("i8"), lo_i8, hi_i8)
+    return np.flatnonzero((tv >= t0_np) & (tv <= t1_np))
+
+
 def _ensure_time_datetime(ds: xr.Dataset, time_var: str) -> Tuple[xr.Dataset, xr.DataArray]:
     """
     Asegura que ds[time_var] sea datetime64.
-    Si no lo es, intenta convertir con decode_cf (si falla, deja como está).
+    Si no lo es, intenta convertir sólo esa variable con CFDatetimeCoder
+    (sin pasar por todo xr.decode_cf); si falla, la deja como está.
     """
     t = ds[time_var]
     if np.issubdtype(t.dtype, np.datetime64):
         return ds, t
 
-    logger.info(f"Intentando convertir variable de tiempo '{time_var}' a datetime64 usando decode_cf...")
+    logger.info(f"Intentando convertir variable de tiempo '{time_var}' a datetime64 usando CFDatetimeCoder...")
     try:
-        t_dec = xr.decode_cf(ds[[time_var]])[time_var]
+        from xarray.coding.times import CFDatetimeCoder
+
+        coder = CFDatetimeCoder(use_cftime=False)
+        t_dec = coder.decode(ds[time_var].variable, name=time_var)
+        # Se asigna el Variable decodificado tal cual: conserva en .encoding
+        # units/calendar originales para que se reescriban igual en el NetCDF
         ds = ds.assign_coords({time_var: t_dec})
         t = ds[time_var]
         logger.info(f"Conversión exitosa: dtype={t.dtype}")
@@ -164,69 +255,103 @@ def _ensure_time_datetime(ds: xr.Dataset, time_var: str) -> Tuple[xr.Dataset, xr
         return ds, t
 
 
-def filtrar_por_tiempo(ds: xr.Dataset, t0: datetime, t1: datetime) -> xr.Dataset:
+def filtrar_por_tiempo(
+    ds: xr.Dataset,
+    t0: Union[np.datetime64, datetime],
+    t1: Union[np.datetime64, datetime],
+) -> Tuple[xr.Dataset, Optional[str]]:
     """
     Filtra el Dataset en el rango [t0, t1] usando la variable de tiempo disponible.
+    t0/t1 pueden venir ya como np.datetime64 (recomendado en lotes: se evita
+    la conversión en cada llamada) o como datetime.
     Intenta TIME, luego JULD, luego time.
-    El filtrado se hace con .where(mask, drop=True) para evitar problemas de índice.
+    El filtrado se hace con .isel sobre la dimensión de tiempo (selección posicional).
+    Devuelve (ds_filtrado, time_var); el tiempo ya decodificado queda asignado
+    como coordenada en ds_filtrado, así que puede reutilizarse sin volver a decodificar.
     """
     logger.info("Aplicando filtro temporal en xarray...")
 
     time_var = _get_time_var(ds)
     if time_var is None:
         logger.warning("No se encontró variable de tiempo (TIME/JULD/time). No se aplica filtro temporal.")
-        return ds
+        return ds, None
 
     logger.info(f"Variable de tiempo detectada: {time_var}")
     ds, t = _ensure_time_datetime(ds, time_var)
 
     if not np.issubdtype(t.dtype, np.datetime64):
         logger.warning(
-            f"La variable de tiempo '{time_var}' no es datetime64 después de intentar decode_cf. "
+            f"La variable de tiempo '{time_var}' no es datetime64 después de intentar decodificarla. "
             "Se omite el filtro temporal."
         )
-        return ds
+        return ds, time_var
 
-    # Construimos máscara booleana
-    t0_np = np.datetime64(t0)
-    t1_np = np.datetime64(t1)
-    mask = (t >= t0_np) & (t <= t1_np)
-
-    if not mask.any():
-        logger.warning("No hay datos dentro del rango temporal solicitado. Dataset se vacía.")
-        # Suponemos que el tiempo tiene una única dimensión
-        time_dim = t.dims[0] if len(t.dims) > 0 else None
-        if time_dim is not None and time_dim in ds.dims:
-            return ds.isel({time_dim: slice(0, 0)})
+    if t.ndim != 1:
+        logger.warning(
+            f"La variable de tiempo '{time_var}' tiene {t.ndim} dimensiones (se esperaba 1). "
+            "Se omite el filtro temporal."
+        )
+        return ds, time_var
+
+    t0_np = t0 if isinstance(t0, np.datetime64) else np.datetime64(t0, "ns")
+    t1_np = t1 if isinstance(t1, np.datetime64) else np.datetime64(t1, "ns")
+    time_dim = t.dims[0]
+    tv = t.values
+
+    if _es_monotono(tv):
+        # Tiempo monótono (caso habitual en ARGO): dos búsquedas binarias
+        # dan los límites del rango, sin construir máscaras temporales.
+        lo = int(np.searchsorted(tv, t0_np, side="left"))
+        hi = int(np.searchsorted(tv, t1_np, side="right"))
+        ds_filtrado = ds.isel({time_dim: slice(lo, hi)})
+        n_sel = max(hi - lo, 0)
+    else:
+        # Tiempo no monótono (o con NaT): índices dentro del rango (Numba si está disponible).
+        # Selección posicional con isel: evita que .where(mask, drop=True) difunda
+        # la máscara sobre todas las variables (explosión de memoria).
+        idx = _indices_en_rango(tv, t0_np, t1_np)
+        n_sel = idx.size
+        if n_sel > 0 and idx[-1] - idx[0] + 1 == n_sel:
+            # Índices contiguos: un slice permite lecturas secuenciales de los chunks
+            ds_filtrado = ds.isel({time_dim: slice(int(idx[0]), int(idx[-1]) + 1)})
         else:
-            # Fallback: devolvemos dataset original (sin filtrar)
-            return ds
+            # Selección dispersa: gather por índices (take)
+            ds_filtrado = ds.isel({time_dim: idx})
 
-    # Filtro con where, evitando el problema de índice
-    ds_filtrado = ds.where(mask, drop=True)
+    if n_sel == 0:
+        logger.warning("No hay datos dentro del rango temporal solicitado. Dataset se vacía.")
 
     # Intentar estimar número de perfiles/puntos
-    n_perfiles = ds_filtrado.dims.get("N_PROF", None)
+    n_perfiles = ds_filtrado.sizes.get("N_PROF", None)
     if n_perfiles is None:
         # si no existe N_PROF, usamos la dimensión de 't'
         if len(t.dims) > 0:
             td = t.dims[0]
-            n_perfiles = ds_filtrado.dims.get(td, "desconocido")
+            n_perfiles = ds_filtrado.sizes.get(td, "desconocido")
         else:
             n_perfiles = "desconocido"
 
     logger.info(f"Perfiles/puntos en rango temporal: {n_perfiles}")
-    logger.info(f"Dimensiones después del filtro temporal: {dict(ds_filtrado.sizes)}")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "Dimensiones después del filtro temporal: %s",
+            {k: int(v) for k, v in ds_filtrado.sizes.items()},
+        )
 
-    return ds_filtrado
+    # Se materializa la selección (sólo tiene efecto si el dataset está respaldado por dask)
+    return ds_filtrado.load(), time_var
 
 
-def inferir_rango_temporal_desde_ds(ds: xr.Dataset) -> Tuple[Optional[datetime], Optional[datetime]]:
+def inferir_rango_temporal_desde_ds(
+    ds: xr.Dataset, time_var: Optional[str] = None
+) -> Tuple[Optional[datetime], Optional[datetime]]:
     """
     Infere las fechas mínima y máxima del dataset a partir de la variable TIME/JULD/time.
+    Si se pasa time_var (p.ej. el devuelto por filtrar_por_tiempo), no se vuelve a buscar.
     Devuelve (tmin, tmax) como datetime UTC, o (None, None) si no se puede.
     """
-    time_var = _get_time_var(ds)
+    if time_var is None or time_var not in ds.variables:
+        time_var = _get_time_var(ds)
     if time_var is None:
         logger.warning("No se encontró variable de tiempo para inferir rango temporal del dataset.")
         return None, None
@@ -236,7 +361,7 @@ def inferir_rango_temporal_desde_ds(ds: xr.Dataset) -> Tuple[Optional[datetime],
     if not np.issubdtype(t.dtype, np.datetime64):
         logger.warning(
             f"No se puede inferir rango temporal porque '{time_var}' no es datetime64 "
-            "ni se pudo convertir con decode_cf."
+            "ni se pudo convertir con CFDatetimeCoder."
         )
         return None, None
 
@@ -244,15 +369,21 @@ def inferir_rango_temporal_desde_ds(ds: xr.Dataset) -> Tuple[Optional[datetime],
         logger.warning("La variable de tiempo está vacía; no se puede inferir rango temporal.")
         return None, None
 
-    # t.min() y t.max() devuelven np.datetime64
-    tmin64 = np.datetime64(t.min().values)
-    tmax64 = np.datetime64(t.max().values)
+    tv = t.values
+    # min/max sobre la vista NumPy; sólo se filtran los NaT si los hay
+    # (ndarray.min() propaga NaT, a diferencia de DataArray.min())
+    nat = np.isnat(tv)
+    if nat.any():
+        tv = tv[~nat]
+        if tv.size == 0:
+            logger.warning("La variable de tiempo sólo contiene NaT; no se puede inferir rango temporal.")
+            return None, None
+    tmin64 = tv.min()
+    tmax64 = tv.max()
 
     def to_py_datetime(dt64: np.datetime64) -> datetime:
-        # convertir a segundos desde epoch y luego a datetime UTC
-        return datetime.utcfromtimestamp(
-            (dt64 - np.datetime64("1970-01-01T00:00:00")) / np.timedelta64(1, "s")
-        )
+        # datetime "naive" en UTC
+        return pd.Timestamp(dt64).to_pydatetime().replace(tzinfo=None)
 
     t0 = to_py_datetime(tmin64)
     t1 = to_py_datetime(tmax64)
@@ -273,7 +404,7 @@ def construir_nombre_salida(
         logger.info(f"Nombre de salida proporcionado por el usuario: {salida_usuario}")
         return salida_usuario
 
-    rango = f"{t0:%Y%m%d}-{t1:%Y%m%d}"
+    rango = f"{t0.year:04d}{t0.month:02d}{t0.day:02d}-{t1.year:04d}{t1.month:02d}{t1.day:02d}"
     nombre = f"argo_{float_id}_{rango}.nc"
     logger.info(f"Nombre de salida generado automáticamente: {nombre}")
     return nombre
@@ -282,75 +413,148 @@ def construir_nombre_salida(
 def añadir_attrs_igp(ds: xr.Dataset, float_id: int) -> xr.Dataset:
     """
     Añade atributos globales de institución y lema del IGP.
+    Modifica ds.attrs en el sitio (sin copiar el diccionario ni el Dataset).
     """
-    attrs = dict(ds.attrs) if isinstance(ds.attrs, dict) else {}
-    attrs.update({
+    ds.attrs.update({
         "institution": "Instituto Geofísico del Perú (IGP)",
         "acknowledgement": "IGP: Ciencia para protegernos, ciencia para avanzar",
         "argo_float_id": str(float_id),
-        "history": (
-            attrs.get("history", "") +
-            f"\nCreated by downloadById.py on {datetime.utcnow().isoformat()}Z"
-        ).strip()
     })
-    return ds.assign_attrs(attrs)
+    ds.attrs["history"] = (
+        ds.attrs.get("history", "") +
+        f"\nCreated by downloadById.py on {datetime.utcnow().isoformat()}Z"
+    ).strip()
+    return ds
+
+
+def descargar_dataset(fetcher: ArgoDataFetcher, float_id: int) -> xr.Dataset:
+    """
+    Obtiene el Dataset del flotador tal como lo entrega argopy.
+    - Usa .to_xarray(); argopy descarga y decodifica todo el flotador igual
+      que con .load().data, pero sin guardar el estado en el fetcher.
+    - Sólo si el fetcher no soporta .to_xarray() se recurre a .load().data.
+    """
+    try:
+        return fetcher.float(float_id).to_xarray()
+    except NotImplementedError:
+        logger.info("El fetcher no soporta .to_xarray(); se usa .load().data.")
+        return fetcher.float(float_id).load().data
+
+
+def seleccionar_variables(ds: xr.Dataset, variables: List[str]) -> xr.Dataset:
+    """
+    Conserva sólo las variables de datos pedidas (más la variable de tiempo),
+    descartando QC, historial, etc. antes de filtrar y escribir.
+    Lanza RuntimeError si ninguna de las variables pedidas existe.
+    """
+    pedidas = {v.strip() for v in variables if v.strip()}
+    keep = set(pedidas)
+    time_var = _get_time_var(ds)
+    if time_var is not None:
+        keep.add(time_var)
+
+    seleccion = [v for v in ds.data_vars if v in keep]
+    # La variable de tiempo siempre se conserva: sus alias no cuentan como faltantes
+    faltantes = sorted(pedidas - set(ds.variables) - {"TIME", "JULD", "time"})
+    if faltantes:
+        logger.warning(f"Variables solicitadas no presentes en el dataset: {faltantes}")
+
+    if not seleccion:
+        # ds[[]] descartaría también las coordenadas de tiempo: mejor fallar con claridad
+        logger.error(f"Ninguna de las variables solicitadas existe en el dataset: {sorted(pedidas)}")
+        raise RuntimeError("--vars no coincide con ninguna variable del dataset")
+
+    logger.info(f"Variables conservadas ({len(seleccion)}): {seleccion}")
+    return ds[seleccion]
+
+
+# Claves del encoding de origen que se conservan al escribir
+_ENCODING_ORIGEN = ("dtype", "_FillValue", "scale_factor", "add_offset", "units", "calendar")
+
+
+def construir_encoding(ds: xr.Dataset) -> dict:
+    """
+    Construye el encoding NetCDF por variable: compresión zlib ligera, shuffle
+    y chunks (4096 en la primera dimensión, 64 en las demás), recortados
+    al tamaño real de cada variable.
+    to_netcdf reemplaza (no combina) el .encoding de cada variable listada, así
+    que se parte del encoding de origen (dtype, _FillValue, escala, unidades).
+    """
+    encoding = {}
+    for v in ds.data_vars:
+        da = ds[v]
+        # Sólo variables numéricas con dimensiones (los strings no admiten estos filtros)
+        if da.ndim == 0 or da.dtype.kind not in "biufcmM":
+            continue
+        base = (4096,) + (64,) * (da.ndim - 1)
+        enc = {k: da.encoding[k] for k in _ENCODING_ORIGEN if k in da.encoding}
+        enc.update({
+            "zlib": True,
+            "complevel": 1,
+            "shuffle": True,
+            "chunksizes": tuple(max(1, min(c, s)) for c, s in zip(base, da.shape)),
+        })
+        encoding[v] = enc
+    return encoding
+
+
+def guardar_netcdf(ds: xr.Dataset, salida_nc: str, engine: str = "h5netcdf") -> None:
+    """
+    Escribe el Dataset en NetCDF con encoding por variable usando el motor
+    indicado (h5netcdf por defecto; netcdf4 como alternativa).
+    Si el Dataset está respaldado por dask, la escritura se difiere
+    (compute=False) y se ejecuta bloque a bloque con el scheduler single-threaded.
+    """
+    encoding = construir_encoding(ds)
+    if ds.chunks:
+        delayed = ds.to_netcdf(salida_nc, engine=engine, encoding=encoding, compute=False)
+        delayed.compute(scheduler="single-threaded")
+    else:
+        ds.to_netcdf(salida_nc, engine=engine, encoding=encoding)
 
 
 # =====================================================
 # 2. FUNCIÓN PRINCIPAL
 # =====================================================
 
-def main() -> None:
-    # ----------------- Parser de argumentos -----------------
-    parser = argparse.ArgumentParser(
-        description="Descarga datos ARGO de un flotador y guarda en NetCDF."
-    )
-    parser.add_argument(
-        "codigo",
-        help=(
-            "Código WMO del flotador (p.ej. 3902585) "
-            "o archivo .py con FLOAT_ID / ARGO_CODE / ARGO_CODES."
-        ),
-    )
-    parser.add_argument(
-        "--days",
-        type=int,
-        default=None,
-        help=(
-            "Número de días hacia atrás desde hoy (UTC) para el rango temporal. "
-            "Si NO se proporciona, se usa TODO el periodo disponible (sin filtro temporal)."
-        ),
-    )
-    parser.add_argument(
-        "--src",
-        choices=("erddap", "gdac"),
-        default="erddap",
-        help="Fuente de datos para argopy.",
-    )
-    parser.add_argument(
-        "--mode",
-        choices=("expert", "standard"),
-        default="expert",
-        help="Modo de argopy.",
-    )
-    parser.add_argument(
-        "-o", "--output",
-        help="Nombre de archivo NetCDF de salida. Si se omite, se genera uno automáticamente."
-    )
-
-    args = parser.parse_args()
-
+def run(
+    float_id: int,
+    days: Optional[int] = None,
+    src: str = "erddap",
+    mode: str = "expert",
+    output: Optional[str] = None,
+    engine: str = "h5netcdf",
+    variables: Optional[str] = None,
+) -> str:
+    """
+    Descarga, filtra y guarda en NetCDF los datos de un flotador.
+    Devuelve la ruta del archivo generado. Si la descarga o la escritura
+    fallan lanza RuntimeError (no SystemExit), para que un fallo en un
+    flotador no aborte un lote completo.
+
+    Es reentrante (no lee sys.argv), de modo que un script de lotes puede
+    procesar varios flotadores en paralelo; la descarga está limitada por E/S
+    (HTTP a erddap/gdac), así que los hilos sí aprovechan la concurrencia:
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=8) as ex:
+            futuros = {ex.submit(run, fid): fid for fid in ids}
+        for fut, fid in futuros.items():
+            try:
+                salida = fut.result()
+            except RuntimeError as exc:
+                ...  # sólo se pierde este flotador
+    """
     logger.info("=== INICIANDO DESCARGA ARGO ===")
     logger.info("IGP: Ciencia para protegernos, ciencia para avanzar")
 
     # ----------------- 2.1. Código de flotador -----------------
-    float_id = leer_codigo_desde_arg(args.codigo)
     logger.info(f"Flotador seleccionado: {float_id}")
 
     # ----------------- 2.2. Rango de fechas (si se indica --days) -----------------
-    if args.days is not None:
+    if days is not None:
         fecha_final = datetime.utcnow()
-        fecha_inicial = fecha_final - timedelta(days=args.days)
+        fecha_inicial = fecha_final - timedelta(days=days)
         date_range_str = f"{fecha_inicial:%Y-%m-%d} → {fecha_final:%Y-%m-%d}"
         logger.info(f"Rango de fechas solicitado (UTC): {date_range_str}")
 
@@ -364,45 +568,52 @@ def main() -> None:
         )
 
     # ----------------- 2.3. Configuración argopy -----------------
-    logger.info(f"Configurando argopy: src='{args.src}', mode='{args.mode}'")
-    argopy.set_options(mode=args.mode, src=args.src)
-    fetcher = ArgoDataFetcher(mode=args.mode, src=args.src)
+    logger.info(f"Configurando argopy: src='{src}', mode='{mode}'")
+    # argopy descarga vía fsspec/aiohttp, que ya negocia gzip/deflate con erddap;
+    # se amplía el timeout porque las respuestas de flotadores largos son pesadas.
+    argopy.set_options(mode=mode, src=src, api_timeout=120)
+    fetcher = ArgoDataFetcher(mode=mode, src=src)
 
     # ----------------- 2.4. Descarga -----------------
     logger.info(
-        f"Descargando datos desde '{args.src}' en modo '{args.mode}' "
+        f"Descargando datos desde '{src}' en modo '{mode}' "
         f"(sin filtro temporal en servidor)..."
     )
 
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        try:
-            ds = fetcher.float(float_id).load().data
-        except Exception as exc:
-            logger.error(f"Error al descargar datos del flotador {float_id}: {exc}")
-            raise SystemExit(1)
+    try:
+        ds = descargar_dataset(fetcher, float_id)
+    except Exception as exc:
+        logger.error(f"Error al descargar datos del flotador {float_id}: {exc}")
+        raise RuntimeError(f"Error al descargar datos del flotador {float_id}") from exc
 
     if not isinstance(ds, xr.Dataset) or len(ds.variables) == 0:
         logger.error("No se obtuvieron datos para ese flotador.")
-        raise SystemExit(1)
+        raise RuntimeError(f"No se obtuvieron datos para el flotador {float_id}")
 
     logger.info(f"Dimensiones originales del dataset: {dict(ds.sizes)}")
     logger.info(f"Número de variables originales: {len(ds.data_vars)}")
 
+    # ----------------- 2.4b. Selección de variables (antes del filtro y la escritura) -----------------
+    if variables and variables.lower() != "all":
+        ds = seleccionar_variables(ds, variables.split(","))
+
     # ----------------- 2.5. Filtro temporal en xarray (opcional) -----------------
+    time_var = None
     if fecha_inicial is not None and fecha_final is not None:
-        ds = filtrar_por_tiempo(ds, fecha_inicial, fecha_final)
+        t0_np = np.datetime64(fecha_inicial, "ns")
+        t1_np = np.datetime64(fecha_final, "ns")
+        ds, time_var = filtrar_por_tiempo(ds, t0_np, t1_np)
     else:
         logger.info("Sin filtro temporal: se mantiene el rango completo de datos.")
 
     # ----------------- 2.6. Inferir rango temporal real para el nombre -----------------
-    t0_name, t1_name = inferir_rango_temporal_desde_ds(ds)
+    t0_name, t1_name = inferir_rango_temporal_desde_ds(ds, time_var=time_var)
 
     if t0_name is not None and t1_name is not None:
-        salida_nc = construir_nombre_salida(float_id, t0_name, t1_name, args.output)
+        salida_nc = construir_nombre_salida(float_id, t0_name, t1_name, output)
     else:
-        if args.output:
-            salida_nc = args.output
+        if output:
+            salida_nc = output
             logger.info(f"No se pudo inferir rango temporal; usando nombre proporcionado: {salida_nc}")
         else:
             salida_nc = f"argo_{float_id}_full.nc"
@@ -413,14 +624,88 @@ def main() -> None:
 
     logger.info(f"Guardando dataset en NetCDF: {salida_nc}")
     try:
-        ds.to_netcdf(salida_nc)
+        guardar_netcdf(ds, salida_nc, engine=engine)
     except Exception as exc:
         logger.error(f"No se pudo escribir el archivo NetCDF '{salida_nc}': {exc}")
-        raise SystemExit(1)
+        raise RuntimeError(f"No se pudo escribir el archivo NetCDF '{salida_nc}'") from exc
 
     logger.info(f"[OK] Datos guardados en: {salida_nc}")
     logger.info("=== DESCARGA COMPLETADA ===")
     logger.info("IGP: Ciencia para protegernos, ciencia para avanzar")
+    return salida_nc
+
+
+def main() -> None:
+    # ----------------- Parser de argumentos -----------------
+    parser = argparse.ArgumentParser(
+        description="Descarga datos ARGO de un flotador y guarda en NetCDF."
+    )
+    parser.add_argument(
+        "codigo",
+        help=(
+            "Código WMO del flotador (p.ej. 3902585) "
+            "o archivo .py con FLOAT_ID / ARGO_CODE / ARGO_CODES."
+        ),
+    )
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=None,
+        help=(
+            "Número de días hacia atrás desde hoy (UTC) para el rango temporal. "
+            "Si NO se proporciona, se usa TODO el periodo disponible (sin filtro temporal)."
+        ),
+    )
+    parser.add_argument(
+        "--src",
+        choices=("erddap", "gdac"),
+        default="erddap",
+        help="Fuente de datos para argopy.",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=("expert", "standard"),
+        default="expert",
+        help="Modo de argopy.",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=("h5netcdf", "netcdf4"),
+        default="h5netcdf",
+        help=(
+            "Motor de escritura NetCDF. h5netcdf (por defecto) es más rápido; "
+            "ambos escriben NETCDF4 (use netcdf4 si prefiere la librería libnetcdf)."
+        ),
+    )
+    parser.add_argument(
+        "--vars",
+        default="all",
+        help=(
+            "Lista de variables a conservar, separadas por comas (p.ej. TEMP,PSAL,PRES). "
+            "Por defecto 'all': se conservan todas las variables del dataset (incluidos QC)."
+        ),
+    )
+    parser.add_argument(
+        "-o", "--output",
+        help="Nombre de archivo NetCDF de salida. Si se omite, se genera uno automáticamente."
+    )
+
+    args = parser.parse_args()
+
+    float_id = leer_codigo_desde_arg(args.codigo)
+    try:
+        run(
+            float_id,
+            days=args.days,
+            src=args.src,
+            mode=args.mode,
+            output=args.output,
+            engine=args.engine,
+            variables=args.vars,
+        )
+    except RuntimeError:
+        # El detalle ya se registró en run()
+        raise SystemExit(1)
 
 
 # =====================================================